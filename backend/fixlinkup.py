@@ -1,17 +1,16 @@
+"""One-shot patch replacing the LinkupClient dependency in utils.py with a placeholder.
+
+Run it once after install, never import it:
+
+    $ python fixlinkup.py
+"""
 import os
 import re
 
 # Path to utils.py
 utils_path = os.path.join(os.path.dirname(__file__), 'utils.py')
 
-with open(utils_path, 'r') as f:
-    content = f.read()
-
-# Comment out the problematic import
-if "from linkup import LinkupClient" in content:
-    content = content.replace("from linkup import LinkupClient", "# from linkup import LinkupClient  # Commented out")
-
-# Replace the linkup_search function
+# Replacement for the linkup_search function
 linkup_replacement = '''
 @traceable
 async def linkup_search(search_queries, depth: Optional[str] = "standard"):
@@ -29,13 +28,29 @@ async def linkup_search(search_queries, depth: Optional[str] = "standard"):
     return search_results
 '''
 
-# Find the original function and replace it
-pattern = r'@traceable\nasync def linkup_search.*?return search_results'
-if re.search(pattern, content, re.DOTALL):
-    content = re.sub(pattern, linkup_replacement.strip(), content, flags=re.DOTALL)
+# Pattern of the original function
+LINKUP_SEARCH_RE = re.compile(r'@traceable\nasync def linkup_search.*?return search_results', re.DOTALL)
+
+def main():
+    with open(utils_path, 'r') as f:
+        content = f.read()
+
+    # Already patched, nothing to do
+    if "# Commented out" in content:
+        print("utils.py already patched")
+        return
+
+    # Comment out the problematic import
+    content = content.replace("from linkup import LinkupClient", "# from linkup import LinkupClient  # Commented out")
+
+    # Find the original function and replace it
+    content = LINKUP_SEARCH_RE.sub(lambda _: linkup_replacement.strip(), content)
+
+    # Write the modified content back
+    with open(utils_path, 'w') as f:
+        f.write(content)
 
-# Write the modified content back
-with open(utils_path, 'w') as f:
-    f.write(content)
+    print("Fixed LinkupClient import in utils.py")
 
-print("Fixed LinkupClient import in utils.py")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,21 @@
-from typing import Literal
+import asyncio
+import json
+from typing import Literal, Optional
+
+import orjson
 
-from langchain.chat_models import init_chat_model
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.runnables import RunnableConfig
+from langgraph.cache.memory import InMemoryCache
 from langgraph.checkpoint.memory import MemorySaver
-from langgraph.types import Send
+from langgraph.types import Send, CachePolicy, RetryPolicy
 from langgraph.graph import START, END, StateGraph
 from langgraph.types import Command # interrupt
 
 from state import (
     ReportStateInput,
     ReportStateOutput,
+    Section,
     Sections,
     ReportState,
     SectionState,
@@ -30,21 +35,50 @@ from prompts import (
 )
 
 from configuration import Configuration
+from search_cache import get_or_fetch, search_key
 from utils import (
-    init_model_with_provider,
+    get_chat_model,
+    get_structured_model,
     format_sections, 
     get_config_value, 
     get_search_params, 
     select_and_execute_search
 )
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from typing import List
 
+def _loads_json(json_str: str):
+    """Parse JSON with orjson, falling back to the more lenient stdlib parser (e.g. NaN)."""
+    try:
+        return orjson.loads(json_str)
+    except orjson.JSONDecodeError:
+        return json.loads(json_str)
+
 class QueryItem(BaseModel):
     search_query: str
 class SearchResults(BaseModel):
     queries: List[QueryItem]
 
+def query_writer_messages(topic: str, section: Section, number_of_queries: int) -> list:
+    """Build the query writer prompt for a single section."""
+    system_instructions = query_writer_instructions.format(topic=topic, 
+                                                           section_topic=section.description, 
+                                                           number_of_queries=number_of_queries)
+    return [SystemMessage(content=system_instructions),
+            HumanMessage(content="Generate search queries on the provided topic.")]
+
+def planner_thinking_budget(planner_model: str) -> Optional[int]:
+    """Allocate a thinking budget for claude-3-7-sonnet-latest as the planner model."""
+    return 16_000 if planner_model == "claude-3-7-sonnet-latest" else None
+
+def get_configuration(state: dict, config: RunnableConfig) -> Configuration:
+    """Get the configuration resolved once per run, falling back to parsing config."""
+    return state.get("resolved_config") or Configuration.from_runnable_config(config)
+
+def get_queries(queries) -> list:
+    """Get the list of search queries from a structured output response."""
+    return queries.get("queries", []) if isinstance(queries, dict) else getattr(queries, "queries", [])
+
 ## Nodes -- 
 
 async def generate_report_plan(state: ReportState, config: RunnableConfig):
@@ -83,15 +117,29 @@ async def generate_report_plan(state: ReportState, config: RunnableConfig):
     # Set writer model (model used for query writing)
     writer_provider = get_config_value(configurable.writer_provider)
     writer_model_name = get_config_value(configurable.writer_model)
-    writer_model = init_model_with_provider(writer_model_name, writer_provider) 
-    structured_llm = writer_model.with_structured_output(Queries)
+    structured_llm = await get_structured_model(writer_model_name, writer_provider, Queries)
+
+    # Get the planner
+    planner_provider = get_config_value(configurable.planner_provider)
+    planner_model = get_config_value(configurable.planner_model)
 
     # Format system instructions
     system_instructions_query = report_planner_query_writer_instructions.format(topic=topic, report_organization=report_structure, number_of_queries=number_of_queries)
 
-    # Generate queries  
-    results = structured_llm.invoke([SystemMessage(content=system_instructions_query),
-                                     HumanMessage(content="Generate search queries that will help with planning the sections of the report.")])
+    # Generate queries while the planner model is initialized off the event loop
+    if planner_provider == "groq":
+        # For Groq, avoid tool-calling structured output and constrain decoding to a JSON object instead
+        planner_init = get_chat_model(planner_model, planner_provider)
+    else:
+        # For other providers like OpenAI, use structured output
+        planner_init = get_structured_model(planner_model, planner_provider, Sections, planner_thinking_budget(planner_model))
+    results, planner_llm = await asyncio.gather(
+        structured_llm.ainvoke([SystemMessage(content=system_instructions_query),
+                                HumanMessage(content="Generate search queries that will help with planning the sections of the report.")]),
+        planner_init
+    )
+    if planner_provider == "groq":
+        planner_llm = planner_llm.bind(response_format={"type": "json_object"})
 
     # Web search
     # query_list = [query.search_query for query in results.queries]
@@ -101,87 +149,48 @@ async def generate_report_plan(state: ReportState, config: RunnableConfig):
 
 
     # Search the web with parameters
-    source_str = await select_and_execute_search(search_api, query_list, params_to_pass)
+    source_str = await get_or_fetch(search_key(search_api, query_list, params_to_pass),
+                                    lambda: select_and_execute_search(search_api, query_list, params_to_pass))
 
     # Format system instructions
     system_instructions_sections = report_planner_instructions.format(topic=topic, report_organization=report_structure, context=source_str, feedback=feedback)
 
-    # Get the planner
-    planner_provider = get_config_value(configurable.planner_provider)
-    planner_model = get_config_value(configurable.planner_model)
-    
     # Report planner instructions
     planner_message = """Generate the sections of the report. Each section must have: name, description, research (boolean indicating if research is needed), and content fields.
                       Format your response as a valid JSON object containing a 'sections' array."""
     
     # Run the planner with provider-specific handling
     if planner_provider == "groq":
-        # For Groq, avoid using structured output directly
-        planner_llm = init_chat_model(model=planner_model, 
-                                      model_provider=planner_provider)
-        
-        # Get raw response and parse manually
-        response = planner_llm.invoke([SystemMessage(content=system_instructions_sections),
-                                      HumanMessage(content=planner_message)])
-        
-        # Extract JSON from the response
-        import json
-        import re
+        # JSON mode doesn't support streaming, so get the whole response at once
+        response = await planner_llm.ainvoke([SystemMessage(content=system_instructions_sections),
+                                              HumanMessage(content=planner_message)])
+        content = str(response.content)
         
-        # Try to extract JSON using regex for flexibility
-        content = response.content
-        json_match = re.search(r'```json\s*([\s\S]*?)\s*```', str(content))
-        if json_match:
-            json_str = json_match.group(1)
-        else:
-            # If no code block, try to find JSON directly
-            match = re.search(r'(\{[\s\S]*\})', str(content))
-            if match:
-                json_str = match.group(1)
-            else:
-                raise ValueError("No JSON object found in the response content.")
-        
-        try:
-            # Parse the JSON
-            sections_data = json.loads(json_str)
-            # Convert to Section objects
-            from state import Section
-            sections = [Section(**section_data) for section_data in sections_data.get('sections', [])]
-        except Exception as e:
-            print(f"Error parsing sections JSON: {e}")
-            # Fallback to a basic structure
-            from state import Section
-            sections = [
-                Section(name="Introduction", description="Introduction to the topic", research=False, content=""),
-                Section(name="Main Content", description=f"Primary information about {topic}", research=True, content=""),
-                Section(name="Conclusion", description="Summary of findings", research=False, content="")
-            ]
+        # Parse the JSON object and validate it into Section objects (raises PLAN_PARSE_ERRORS, retried by planner_retry_policy)
+        sections = Sections.model_validate(_loads_json(content)).sections
     else:
-        # For other providers like OpenAI, use structured output
-        if planner_model == "claude-3-7-sonnet-latest":
-            planner_llm = init_chat_model(model=planner_model, 
-                                        model_provider=planner_provider, 
-                                        max_tokens=20_000, 
-                                        thinking={"type": "enabled", "budget_tokens": 16_000})
-        else:
-            planner_llm = init_chat_model(model=planner_model, 
-                                        model_provider=planner_provider)
-        
         # Generate the report sections with structured output
-        structured_llm = planner_llm.with_structured_output(Sections)
-        report_sections = structured_llm.invoke([SystemMessage(content=system_instructions_sections),
-                                                HumanMessage(content=planner_message)])
+        report_sections = await planner_llm.ainvoke([SystemMessage(content=system_instructions_sections),
+                                                    HumanMessage(content=planner_message)])
         
         # Get sections
         sections = report_sections.get("sections", []) if isinstance(report_sections, dict) else getattr(report_sections, "sections", [])
        
 
-    return {"sections": sections}
+    # Partition sections once for the research and final-section fanouts
+    research_sections = [s for s in sections if s.research]
+    non_research_sections = [s for s in sections if not s.research]
+
+    return {"sections": sections, 
+            "research_sections": research_sections, 
+            "non_research_sections": non_research_sections, 
+            "resolved_config": configurable}
 
-def human_feedback(state: ReportState, config: RunnableConfig) -> Command[Literal["generate_report_plan","build_section_with_web_research"]]:
+def human_feedback(state: ReportState, config: RunnableConfig) -> Command[Literal["generate_report_plan","generate_all_queries"]]:
     """Get human feedback on the report plan and route to next steps.
     
-    This node:
+    The human review interrupt is currently disabled, so this node approves
+    the plan and routes to section writing. With the interrupt enabled it:
     1. Formats the current report plan for human review
     2. Gets feedback via an interrupt
     3. Routes to either:
@@ -196,35 +205,23 @@ def human_feedback(state: ReportState, config: RunnableConfig) -> Command[Litera
         Command to either regenerate plan or start section writing
     """
 
-    # Get sections
-    topic = state["topic"]
-    sections = state['sections']
-    sections_str = "\n\n".join(
-        f"Section: {section.name}\n"
-        f"Description: {section.description}\n"
-        f"Research needed: {'Yes' if section.research else 'No'}\n"
-        for section in sections
-    )
-
     # Get feedback on the report plan from interrupt
-    interrupt_message = f"""Please provide feedback on the following report plan. 
-                        \n\n{sections_str}\n
-                        \nDoes the report plan meet your needs?\nPass 'true' to approve the report plan.\nOr, provide feedback to regenerate the report plan:"""
-    
-    print("Interrupt message:", interrupt_message)
-
+    # sections_str = "\n\n".join(
+    #     f"Section: {section.name}\n"
+    #     f"Description: {section.description}\n"
+    #     f"Research needed: {'Yes' if section.research else 'No'}\n"
+    #     for section in state["sections"]
+    # )
+    # interrupt_message = f"""Please provide feedback on the following report plan. 
+    #                     \n\n{sections_str}\n
+    #                     \nDoes the report plan meet your needs?\nPass 'true' to approve the report plan.\nOr, provide feedback to regenerate the report plan:"""
     # feedback = interrupt(interrupt_message)
 
     # If the user approves the report plan, kick off section writing
     # if isinstance(feedback, bool) and feedback is True:
         # Treat this as approve and kick off section writing
-        # return Command(goto=[
-    # print("Feedback",interrupt_message)
-    return Command(goto=[
-            Send("build_section_with_web_research", {"topic": topic, "section": s, "search_iterations": 0}) 
-            for s in sections 
-            if s.research
-        ])
+        # return Command(goto="generate_all_queries")
+    return Command(goto="generate_all_queries")
     
     # If the user provides feedback, regenerate the report plan 
     # elif isinstance(feedback, str):
@@ -234,7 +231,45 @@ def human_feedback(state: ReportState, config: RunnableConfig) -> Command[Litera
     # else:
         # raise TypeError(f"Interrupt value of type {type(feedback)} is not supported.")
     
-def generate_queries(state: SectionState, config: RunnableConfig):
+async def generate_all_queries(state: ReportState, config: RunnableConfig) -> Command[Literal["build_section_with_web_research"]]:
+    """Generate search queries for every research section in one batch.
+    
+    This node sends the query-writing prompts of all research sections to
+    the writer model in a single batch, then kicks off section research in
+    parallel with the queries already attached.
+    
+    Args:
+        state: Current graph state with the approved sections
+        config: Configuration including number of queries to generate
+        
+    Returns:
+        Command to start section research for each research section
+    """
+
+    # Get state
+    topic = state["topic"]
+    research_sections = state["research_sections"]
+
+    # Get configuration
+    configurable = get_configuration(state, config)
+    number_of_queries = configurable.number_of_queries
+
+    # Generate queries
+    writer_provider = get_config_value(configurable.writer_provider)
+    writer_model_name = get_config_value(configurable.writer_model)
+    structured_llm = await get_structured_model(writer_model_name, writer_provider, Queries)
+
+    # Batch the query prompts of all sections, retrying failed calls per section
+    message_lists = [query_writer_messages(topic, s, number_of_queries) for s in research_sections]
+    results = await structured_llm.with_retry(stop_after_attempt=3).abatch(message_lists, config=config) if message_lists else []
+
+    # Kick off section research in parallel via Send() API with the queries attached
+    return Command(goto=[
+            Send("build_section_with_web_research", {"topic": topic, "section": s, "search_queries": get_queries(queries), "search_iterations": 0, "resolved_config": configurable}) 
+            for s, queries in zip(research_sections, results)
+        ])
+
+async def generate_queries(state: SectionState, config: RunnableConfig):
     """Generate search queries for researching a specific section.
     
     This node uses an LLM to generate targeted search queries based on the 
@@ -253,25 +288,22 @@ def generate_queries(state: SectionState, config: RunnableConfig):
     section = state["section"]
 
     # Get configuration
-    configurable = Configuration.from_runnable_config(config)
+    configurable = get_configuration(state, config)
     number_of_queries = configurable.number_of_queries
 
     # Generate queries 
     writer_provider = get_config_value(configurable.writer_provider)
     writer_model_name = get_config_value(configurable.writer_model)
-    writer_model = init_chat_model(model=writer_model_name, model_provider=writer_provider) 
-    structured_llm = writer_model.with_structured_output(Queries)
-
-    # Format system instructions
-    system_instructions = query_writer_instructions.format(topic=topic, 
-                                                           section_topic=section.description, 
-                                                           number_of_queries=number_of_queries)
+    structured_llm = await get_structured_model(writer_model_name, writer_provider, Queries)
 
     # Generate queries  
-    queries = structured_llm.invoke([SystemMessage(content=system_instructions),
-                                     HumanMessage(content="Generate search queries on the provided topic.")])
+    queries = await structured_llm.ainvoke(query_writer_messages(topic, section, number_of_queries))
     # print("\n-------Queries:----------",queries)
-    return {"search_queries": queries.get("queries", []) if isinstance(queries, dict) else getattr(queries, "queries", [])}
+    return {"search_queries": get_queries(queries)}
+
+def route_section_start(state: SectionState) -> Literal["generate_queries", "search_web"]:
+    """Skip query generation when the section arrives with its queries already batched."""
+    return "search_web" if state.get("search_queries") else "generate_queries"
 
 async def search_web(state: SectionState, config: RunnableConfig):
     """Execute web searches for the section queries.
@@ -293,22 +325,21 @@ async def search_web(state: SectionState, config: RunnableConfig):
     search_queries = state["search_queries"]
 
     # Get configuration
-    configurable = Configuration.from_runnable_config(config)
+    configurable = get_configuration(state, config)
     search_api = get_config_value(configurable.search_api)
     search_api_config = configurable.search_api_config or {}  # Get the config dict, default to empty
     params_to_pass = get_search_params(search_api, search_api_config)  # Filter parameters
 
-    # Web search
-    query_list = [query.search_query for query in search_queries]
+    # Web search, dropping empty and duplicate queries while preserving order
+    query_list = list(dict.fromkeys(query.search_query for query in search_queries if query.search_query))
     # print("\n-------Query List:----------",query_list)
     # Search the web with parameters
-    # source_str = await select_and_execute_search(search_api, query_list, params_to_pass)
-    query_list = [q for q in query_list if q is not None]
-    source_str = await select_and_execute_search(search_api, query_list, params_to_pass)
+    source_str = await get_or_fetch(search_key(search_api, query_list, params_to_pass),
+                                    lambda: select_and_execute_search(search_api, query_list, params_to_pass))
 
     return {"source_str": source_str, "search_iterations": state["search_iterations"] + 1}
 
-def write_section(state: SectionState, config: RunnableConfig) -> Command[Literal[END, "search_web"]]: # type: ignore
+async def write_section(state: SectionState, config: RunnableConfig) -> Command[Literal[END, "search_web"]]: # type: ignore
     """Write a section of the report and evaluate if more research is needed.
     
     This node:
@@ -332,7 +363,7 @@ def write_section(state: SectionState, config: RunnableConfig) -> Command[Litera
     source_str = state["source_str"]
 
     # Get configuration
-    configurable = Configuration.from_runnable_config(config)
+    configurable = get_configuration(state, config)
 
     # Format system instructions
     section_writer_inputs_formatted = section_writer_inputs.format(topic=topic, 
@@ -344,10 +375,10 @@ def write_section(state: SectionState, config: RunnableConfig) -> Command[Litera
     # Generate section  
     writer_provider = get_config_value(configurable.writer_provider)
     writer_model_name = get_config_value(configurable.writer_model)
-    writer_model = init_chat_model(model=writer_model_name, model_provider=writer_provider) 
+    writer_model = await get_chat_model(writer_model_name, writer_provider)
 
-    section_content = writer_model.invoke([SystemMessage(content=section_writer_instructions),
-                                           HumanMessage(content=section_writer_inputs_formatted)])
+    section_content = await writer_model.ainvoke([SystemMessage(content=section_writer_instructions),
+                                                  HumanMessage(content=section_writer_inputs_formatted)])
     
     # Write content to the section object  
     section.content = str(section_content.content) if not isinstance(section_content.content, str) else section_content.content
@@ -366,18 +397,10 @@ def write_section(state: SectionState, config: RunnableConfig) -> Command[Litera
     planner_provider = get_config_value(configurable.planner_provider)
     planner_model = get_config_value(configurable.planner_model)
 
-    if planner_model == "claude-3-7-sonnet-latest":
-        # Allocate a thinking budget for claude-3-7-sonnet-latest as the planner model
-        reflection_model = init_chat_model(model=planner_model, 
-                                           model_provider=planner_provider, 
-                                           max_tokens=20_000, 
-                                           thinking={"type": "enabled", "budget_tokens": 16_000}).with_structured_output(Feedback)
-    else:
-        reflection_model = init_chat_model(model=planner_model, 
-                                           model_provider=planner_provider).with_structured_output(Feedback)
+    reflection_model = await get_structured_model(planner_model, planner_provider, Feedback, planner_thinking_budget(planner_model))
     # Generate feedback
-    feedback = reflection_model.invoke([SystemMessage(content=section_grader_instructions_formatted),
-                                        HumanMessage(content=section_grader_message)])
+    feedback = await reflection_model.ainvoke([SystemMessage(content=section_grader_instructions_formatted),
+                                               HumanMessage(content=section_grader_message)])
 
     # If the section is passing or the max search depth is reached, publish the section to completed sections 
     if isinstance(feedback, dict) and feedback.get("grade") == "pass" or state["search_iterations"] >= configurable.max_search_depth:
@@ -394,44 +417,53 @@ def write_section(state: SectionState, config: RunnableConfig) -> Command[Litera
         goto="search_web"
         )
     
-def write_final_sections(state: SectionState, config: RunnableConfig):
+def final_section_messages(topic: str, section: Section, completed_report_sections: str) -> list:
+    """Build the final section writer prompt for a section that doesn't require research."""
+    system_instructions = final_section_writer_instructions.format(topic=topic, section_name=section.name, section_topic=section.description, context=completed_report_sections)
+    return [SystemMessage(content=system_instructions),
+            HumanMessage(content="Generate a report section based on the provided sources.")]
+
+async def write_final_sections(state: ReportState, config: RunnableConfig):
     """Write sections that don't require research using completed sections as context.
     
     This node handles sections like conclusions or summaries that build on
-    the researched sections rather than requiring direct research.
+    the researched sections rather than requiring direct research. The
+    sections are written in one batch bounded by the run's max_concurrency,
+    and share the research context read once from the graph state.
     
     Args:
-        state: Current state with completed sections as context
+        state: Current state with all sections and research context
         config: Configuration for the writing model
         
     Returns:
-        Dict containing the newly written section
+        Dict containing the newly written sections
     """
 
     # Get configuration
-    configurable = Configuration.from_runnable_config(config)
+    configurable = get_configuration(state, config)
 
     # Get state 
     topic = state["topic"]
-    section = state["section"]
     completed_report_sections = state["report_sections_from_research"]
-    
-    # Format system instructions
-    system_instructions = final_section_writer_instructions.format(topic=topic, section_name=section.name, section_topic=section.description, context=completed_report_sections)
 
-    # Generate section  
+    # Generate sections in parallel
     writer_provider = get_config_value(configurable.writer_provider)
     writer_model_name = get_config_value(configurable.writer_model)
-    writer_model = init_chat_model(model=writer_model_name, model_provider=writer_provider) 
-    
-    section_content = writer_model.invoke([SystemMessage(content=system_instructions),
-                                           HumanMessage(content="Generate a report section based on the provided sources.")])
-    
-    # Write content to section 
-    section.content = str(section_content.content) if not isinstance(section_content.content, str) else section_content.content
+    writer_model = await get_chat_model(writer_model_name, writer_provider)
+
+    # Retry failed calls per section, so one failure doesn't rewrite every section
+    sections = state["non_research_sections"]
+    message_lists = [final_section_messages(topic, s, completed_report_sections) for s in sections]
+    responses = await writer_model.with_retry(stop_after_attempt=3).abatch(
+        message_lists, config={"max_concurrency": config.get("max_concurrency")}
+    )
 
-    # Write the updated section to completed sections
-    return {"completed_sections": [section]}
+    # Write content to sections
+    for section, section_content in zip(sections, responses):
+        section.content = str(section_content.content) if not isinstance(section_content.content, str) else section_content.content
+
+    # Write the updated sections to completed sections
+    return {"completed_sections": sections}
 
 def gather_completed_sections(state: ReportState):
     """Format completed sections as context for writing final sections.
@@ -460,37 +492,13 @@ def compile_final_report(state: ReportState):
     print("Compiling final report with state:", state)
     # Get sections
     sections = state["sections"]
-    completed_sections = {s.name: s.content for s in state["completed_sections"]}
-
-    # Update sections with completed content while maintaining original order
-    for section in sections:
-        section.content = completed_sections.get(section.name, "")  # Using parentheses and providing a default value  # Fixed parentheses and added default
+    content_by_name = {s.name: s.content for s in state["completed_sections"]}
 
-    # Compile final report
-    all_sections = "\n\n".join([s.content for s in sections])
+    # Compile final report with completed content while maintaining original order
+    all_sections = "\n\n".join(content_by_name.get(s.name, "") for s in sections)
 
     return ReportStateOutput(final_report=all_sections)
 
-async def initiate_final_section_writing(state: ReportState):
-    """Create parallel tasks for writing non-research sections.
-    
-    This edge function identifies sections that don't need research and
-    creates parallel writing tasks for each one.
-    
-    Args:
-        state: Current state with all sections and research context
-        
-    Returns:
-        List of Send commands for parallel section writing
-    """
-
-    # Kick off section writing in parallel via Send() API for any sections that do not require research
-    return [
-        Send("write_final_sections", {"topic": state["topic"], "section": s, "report_sections_from_research": state["report_sections_from_research"]}) 
-        for s in state["sections"] 
-        if not s.research
-    ]
-
 # Add this fallback node at the end of the file, before compiling the graph
 def fallback_handler(state: ReportState) -> ReportStateOutput:
     """Handle errors and provide a fallback response."""
@@ -513,16 +521,30 @@ This is a fallback report generated due to an error in the report generation pro
     
     return ReportStateOutput(final_report=fallback_report)
 
+# Retry LLM nodes on transient provider errors (e.g. 429) and cache pure ones
+llm_retry_policy = RetryPolicy(max_attempts=3, backoff_factor=2.0)
+
+# The Groq planner reply can be malformed JSON or miss section fields, both ValueErrors that the default retry_on skips
+PLAN_PARSE_ERRORS = (json.JSONDecodeError, ValidationError)
+
+def retry_planner_on(exc: Exception) -> bool:
+    """Retry the planner on unparseable plans as well as on the default transient errors."""
+    return isinstance(exc, PLAN_PARSE_ERRORS) or llm_retry_policy.retry_on(exc)
+
+planner_retry_policy = llm_retry_policy._replace(retry_on=retry_planner_on)
+node_cache_policy = CachePolicy(ttl=3600)
+cache = InMemoryCache()
+
 # Report section sub-graph -- 
 
 # Add nodes 
 section_builder = StateGraph(SectionState, output=SectionOutputState)
-section_builder.add_node("generate_queries", generate_queries)
+section_builder.add_node("generate_queries", generate_queries, retry_policy=llm_retry_policy, cache_policy=node_cache_policy)
 section_builder.add_node("search_web", search_web)
-section_builder.add_node("write_section", write_section)
+section_builder.add_node("write_section", write_section, retry_policy=llm_retry_policy)
 
 # Add edges
-section_builder.add_edge(START, "generate_queries")
+section_builder.add_conditional_edges(START, route_section_start, ["generate_queries", "search_web"])
 section_builder.add_edge("generate_queries", "search_web")
 section_builder.add_edge("search_web", "write_section")
 
@@ -531,9 +553,10 @@ section_builder.add_edge("search_web", "write_section")
 
 # Add Nodes
 builder = StateGraph(ReportState, input=ReportStateInput, output=ReportStateOutput, config_schema=Configuration)
-builder.add_node("generate_report_plan", generate_report_plan)
+builder.add_node("generate_report_plan", generate_report_plan, retry_policy=planner_retry_policy)
 builder.add_node("human_feedback", human_feedback)
-builder.add_node("build_section_with_web_research", section_builder.compile())
+builder.add_node("generate_all_queries", generate_all_queries)
+builder.add_node("build_section_with_web_research", section_builder.compile(cache=cache))
 builder.add_node("gather_completed_sections", gather_completed_sections)
 builder.add_node("write_final_sections", write_final_sections)
 builder.add_node("compile_final_report", compile_final_report)
@@ -542,9 +565,9 @@ builder.add_node("compile_final_report", compile_final_report)
 builder.add_edge(START, "generate_report_plan")
 builder.add_edge("generate_report_plan", "human_feedback")
 builder.add_edge("build_section_with_web_research", "gather_completed_sections")
-builder.add_conditional_edges("gather_completed_sections", initiate_final_section_writing, ["write_final_sections"])
+builder.add_edge("gather_completed_sections", "write_final_sections")
 builder.add_edge("write_final_sections", "compile_final_report")
 builder.add_edge("compile_final_report", END)
 
 memory = MemorySaver()
-graph = builder.compile(checkpointer=memory)
+graph = builder.compile(checkpointer=memory, cache=cache)
@@ -0,0 +1,22 @@
+"""Gunicorn settings for running the API in production with several Uvicorn workers.
+
+    $ gunicorn server:app -c gunicorn.conf.py
+
+Each worker is a separate process, so REDIS_URL must be set for the workers to share
+jobs, and worker.py must be running to process them.
+"""
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+def on_starting(server):
+    # | In-memory jobs would only be visible to the worker that created them
+    if workers > 1 and not os.getenv("REDIS_URL"):
+        raise RuntimeError("REDIS_URL must be set to run more than one worker")
@@ -0,0 +1,217 @@
+"""Job records of the report generation API, kept in memory or in Redis."""
+
+import asyncio
+import json
+import os
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+import redis.asyncio as redis
+from cachetools import TTLCache
+
+MAX_JOB_AGE_SECONDS = 3600  # 1 hour
+MAX_MEMORY_JOBS = 10000  # Jobs kept by the in-memory store
+JOB_QUEUE_KEY = "report_jobs"  # Redis list of job IDs waiting for a worker
+PROCESSING_KEY_PREFIX = "report_jobs:processing:"  # Redis list per worker of the job IDs it is processing
+WORKERS_KEY = "workers"  # Redis sorted set of worker IDs scored by their last heartbeat
+WORKER_ACTIVE_KEY = "workers:active"  # Redis hash of worker ID -> jobs being processed
+WORKER_CAPACITY_KEY = "workers:capacity"  # Redis hash of worker ID -> jobs processed at once
+WORKER_TTL_SECONDS = 30  # A worker that misses its heartbeats for this long is considered dead
+
+# | Update a job hash only if it still exists, so an expired job isn't recreated without a TTL
+# | KEYS[1] = job hash, ARGV[1] = update channel, ARGV[2:] = field/value pairs
+UPDATE_JOB_SCRIPT = """
+if redis.call("EXISTS", KEYS[1]) == 0 then
+    return 0
+end
+redis.call("HSET", KEYS[1], unpack(ARGV, 2))
+redis.call("HINCRBY", KEYS[1], "version", 1)
+redis.call("PUBLISH", ARGV[1], "updated")
+return 1
+"""
+
+# | Sum the active jobs and capacity of the workers with a heartbeat in the last ARGV[1] seconds
+WORKER_LOAD_SCRIPT = """
+local now = redis.call("TIME")[1]
+local workers = redis.call("ZRANGEBYSCORE", KEYS[1], now - ARGV[1], "+inf")
+local active, capacity = 0, 0
+for _, worker_id in ipairs(workers) do
+    active = active + (tonumber(redis.call("HGET", KEYS[2], worker_id)) or 0)
+    capacity = capacity + (tonumber(redis.call("HGET", KEYS[3], worker_id)) or 0)
+end
+return {active, capacity}
+"""
+
+@dataclass(slots=True)
+class JobRecord:
+    """State of a report generation job."""
+    status: str
+    topic: str
+    created_at: float
+    progress: float = 0.0
+    message: str = ""
+    config_overrides: Optional[Dict[str, Any]] = None
+    report: Optional[Dict[str, str]] = None
+    error: Optional[str] = None
+    version: int = 0  # Bumped on every update
+
+class MemoryJobStore:
+    """Job records in process-local caches that expire after MAX_JOB_AGE_SECONDS, for a single server process."""
+
+    def __init__(self, maxsize: int = MAX_MEMORY_JOBS):
+        # | Expired entries are evicted lazily on access, no cleanup sweep needed
+        self.jobs: TTLCache = TTLCache(maxsize=maxsize, ttl=MAX_JOB_AGE_SECONDS)
+        self.events: TTLCache = TTLCache(maxsize=maxsize, ttl=MAX_JOB_AGE_SECONDS)
+
+    async def create(self, job_id: str, job: JobRecord):
+        self.jobs[job_id] = job
+        self.events[job_id] = asyncio.Event()
+
+    async def get(self, job_id: str) -> Optional[JobRecord]:
+        return self.jobs.get(job_id)
+
+    async def update(self, job_id: str, **fields):
+        """Update a job record and wake up any clients watching it."""
+        job = self.jobs.get(job_id)
+        event = self.events.get(job_id)
+        if job is None or event is None:
+            # | The job expired while it was running
+            return
+        for name, value in fields.items():
+            setattr(job, name, value)
+        job.version += 1
+        event.set()
+        event.clear()
+
+    async def watch(self, job_id: str) -> AsyncIterator[JobRecord]:
+        """Yield the job record now and again after every update."""
+        job = self.jobs[job_id]
+        event = self.events[job_id]
+        while True:
+            version = job.version
+            yield job
+            # | Only wait if nothing changed while the consumer handled the record
+            if job.version == version:
+                await event.wait()
+
+class RedisJobStore:
+    """Job records in Redis hashes that expire after MAX_JOB_AGE_SECONDS, shared by all server processes."""
+
+    def __init__(self, url: str):
+        self.redis = redis.from_url(url, decode_responses=True)
+        self._update_job = self.redis.register_script(UPDATE_JOB_SCRIPT)
+        self._worker_load = self.redis.register_script(WORKER_LOAD_SCRIPT)
+
+    async def enqueue(self, job_id: str):
+        """Push a job onto the queue consumed by worker.py."""
+        await self.redis.lpush(JOB_QUEUE_KEY, job_id)
+
+    async def dequeue(self, worker_id: str) -> str:
+        """Block until a job is queued and move the oldest one to the worker's processing list."""
+        # | Unlike BRPOP, the job stays in Redis until job_finished, so it survives a worker crash (Redis >= 6.2)
+        return await self.redis.blmove(JOB_QUEUE_KEY, PROCESSING_KEY_PREFIX + worker_id, 0, src="RIGHT", dest="LEFT")
+
+    async def queue_length(self) -> int:
+        return await self.redis.llen(JOB_QUEUE_KEY)
+
+    async def _now(self) -> int:
+        """Redis server time in seconds, so heartbeats of all hosts share one clock."""
+        seconds, _ = await self.redis.time()
+        return seconds
+
+    async def register_worker(self, worker_id: str, capacity: int):
+        """Announce a worker and the number of jobs it processes at once."""
+        now = await self._now()
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(WORKER_ACTIVE_KEY, worker_id, 0)
+            pipe.hset(WORKER_CAPACITY_KEY, worker_id, capacity)
+            pipe.zadd(WORKERS_KEY, {worker_id: now})
+            await pipe.execute()
+
+    async def heartbeat(self, worker_id: str, capacity: int):
+        """Keep a worker registered, must be called more often than WORKER_TTL_SECONDS."""
+        now = await self._now()
+        # | Rewrite the capacity too, in case the worker was pruned while it was stalled
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(WORKER_CAPACITY_KEY, worker_id, capacity)
+            pipe.zadd(WORKERS_KEY, {worker_id: now})
+            await pipe.execute()
+
+    async def job_started(self, worker_id: str):
+        await self.redis.hincrby(WORKER_ACTIVE_KEY, worker_id, 1)
+
+    async def job_finished(self, worker_id: str, job_id: str):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.lrem(PROCESSING_KEY_PREFIX + worker_id, 1, job_id)
+            pipe.hincrby(WORKER_ACTIVE_KEY, worker_id, -1)
+            await pipe.execute()
+
+    async def worker_load(self) -> Tuple[int, int]:
+        """Get the jobs being processed and the total capacity of the live workers."""
+        active, capacity = await self._worker_load(keys=[WORKERS_KEY, WORKER_ACTIVE_KEY, WORKER_CAPACITY_KEY],
+                                                   args=[WORKER_TTL_SECONDS])
+        return int(active), int(capacity)
+
+    async def requeue_orphaned_jobs(self) -> int:
+        """Put the jobs of workers that stopped sending heartbeats back on the queue and forget those workers."""
+        now = await self._now()
+        requeued = 0
+        for worker_id in await self.redis.zrangebyscore(WORKERS_KEY, "-inf", f"({now - WORKER_TTL_SECONDS}"):
+            # | Move the jobs one at a time to the front of the queue, newest first so the oldest is dequeued next
+            while await self.redis.lmove(PROCESSING_KEY_PREFIX + worker_id, JOB_QUEUE_KEY, src="LEFT", dest="RIGHT") is not None:
+                requeued += 1
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.zrem(WORKERS_KEY, worker_id)
+                pipe.hdel(WORKER_ACTIVE_KEY, worker_id)
+                pipe.hdel(WORKER_CAPACITY_KEY, worker_id)
+                await pipe.execute()
+        return requeued
+
+    @staticmethod
+    def _key(job_id: str) -> str:
+        return f"job:{job_id}"
+
+    @staticmethod
+    def _channel(job_id: str) -> str:
+        return f"job:{job_id}:updates"
+
+    async def create(self, job_id: str, job: JobRecord):
+        # | Hash values are strings, so each field is stored JSON-encoded
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._key(job_id), mapping={k: json.dumps(v) for k, v in asdict(job).items()})
+            pipe.expire(self._key(job_id), MAX_JOB_AGE_SECONDS)
+            await pipe.execute()
+
+    async def get(self, job_id: str) -> Optional[JobRecord]:
+        data = await self.redis.hgetall(self._key(job_id))
+        return JobRecord(**{k: json.loads(v) for k, v in data.items()}) if data else None
+
+    async def update(self, job_id: str, **fields):
+        """Update a job record and notify any clients watching it."""
+        # | Nothing is written if the job expired while it was running
+        args = [self._channel(job_id)]
+        for k, v in fields.items():
+            args += [k, json.dumps(v)]
+        await self._update_job(keys=[self._key(job_id)], args=args)
+
+    async def watch(self, job_id: str) -> AsyncIterator[JobRecord]:
+        """Yield the job record now and again after every update."""
+        async with self.redis.pubsub() as pubsub:
+            # | Subscribe before the first read so no update is missed in between
+            await pubsub.subscribe(self._channel(job_id))
+            job = await self.get(job_id)
+            if job is None:
+                return
+            yield job
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                job = await self.get(job_id)
+                if job is None:
+                    return
+                yield job
+
+def create_job_store():
+    """Use Redis when REDIS_URL is set, otherwise keep jobs in this process."""
+    redis_url = os.getenv("REDIS_URL")
+    return RedisJobStore(redis_url) if redis_url else MemoryJobStore()
@@ -0,0 +1,60 @@
+"""In-memory cache for web search results."""
+
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+
+MAX_CACHE_ENTRIES = 256  # Number of search results kept in memory
+CACHE_TTL_SECONDS = 3600  # 1 hour
+NO_SOURCES = "Content from sources:"  # Formatted result of a search that found nothing (or failed)
+
+_cache: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+def search_key(search_api: str, query_list: List[str], params_to_pass: Dict[str, Any]) -> Hashable:
+    """Build an exact-match cache key for a search call.
+    
+    Args:
+        search_api: Name of the search API
+        query_list: List of search queries
+        params_to_pass: Parameters passed to the search API
+        
+    Returns:
+        Hashable key, independent of query and parameter order
+    """
+    # Parameter values may be lists (e.g. include_domains), so key on their repr
+    params_key = tuple(sorted((k, repr(v)) for k, v in params_to_pass.items()))
+    return (search_api, tuple(sorted(query_list)), params_key)
+
+def has_sources(result: Any) -> bool:
+    """Whether a formatted search result contains any source worth caching."""
+    return bool(result) and result != NO_SOURCES
+
+async def get_or_fetch(key: Hashable, coro_factory: Callable[[], Awaitable[Any]]) -> Any:
+    """Return the cached result for key, or await coro_factory and cache its result.
+    
+    Results without sources are not cached, since search APIs such as DuckDuckGo
+    return them on transient failures (e.g. rate limits) instead of raising.
+    
+    Args:
+        key: Cache key, see search_key
+        coro_factory: Callable returning the coroutine that fetches the result on a miss
+        
+    Returns:
+        The cached or freshly fetched result
+    """
+    entry = _cache.get(key)
+    if entry is not None and time.time() - entry[0] < CACHE_TTL_SECONDS:
+        _cache.move_to_end(key)
+        return entry[1]
+
+    result = await coro_factory()
+    if not has_sources(result):
+        return result
+
+    # Store the result and evict the least recently used entries
+    _cache[key] = (time.time(), result)
+    _cache.move_to_end(key)
+    while len(_cache) > MAX_CACHE_ENTRIES:
+        _cache.popitem(last=False)
+
+    return result
@@ -1,29 +1,60 @@
 import os
+import hmac
 import uuid
 import time
 import asyncio
 # import json
 from typing import Dict, Optional, Any
-from collections import deque
-import threading
+from contextlib import aclosing, asynccontextmanager
+
+import anyio
 
 from fastapi import FastAPI, HTTPException, Depends, Security, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.security import APIKeyHeader
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from dotenv import load_dotenv
 
+from langchain_core.runnables import RunnableConfig
 from graph import graph
+from job_store import JobRecord, RedisJobStore, create_job_store
 from state import ReportStateInput
 
 # - Load environment variables
 load_dotenv()
 
+THREADPOOL_SIZE = 100  # Worker threads available to sync code run by FastAPI
+
+# - Graph configuration shared by every job, read once at startup (unset values fall back to Configuration defaults)
+CONFIG_TEMPLATE = {
+    key: value
+    for key, value in {
+        "search_api": os.getenv("SEARCH_API"),
+        "planner_provider": os.getenv("PLANNER_PROVIDER"),
+        "planner_model": os.getenv("PLANNER_MODEL"),
+        "writer_provider": os.getenv("WRITER_PROVIDER"),
+        "writer_model": os.getenv("WRITER_MODEL"),
+    }.items()
+    if value is not None
+}
+
+# - Startup and shutdown of the app
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.startup_time = time.time()
+    app.state.cold_start_deadline = app.state.startup_time + 30
+    # | Raise the threadpool limit (default 40) used for sync dependencies and endpoints
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    yield
+
 # - Create FastAPI app
 app = FastAPI(
     title="DeeRes API",
     description="Simple API for deep research and report generation",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # - Add CORS middleware to allow frontend requests
@@ -35,12 +66,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# - Compress large responses such as completed reports (small polling responses are sent as is)
+class ReportGZipMiddleware(GZipMiddleware):
+    """GZip middleware that leaves /job-stream alone, older Starlette versions would buffer its events."""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith("/job-stream/"):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+app.add_middleware(ReportGZipMiddleware, minimum_size=1024)
+
 # - API Key security
 API_KEY_NAME = "X-API-Key"
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
+_API_KEY = os.getenv("API_KEY")  # Read once at startup, unset means requests without a key are accepted
+_API_KEY_BYTES = _API_KEY.encode() if _API_KEY is not None else None
 
 async def get_api_key(api_key_header: str = Security(api_key_header)):
-    if api_key_header == os.getenv("API_KEY"):
+    if api_key_header is None:
+        if _API_KEY is None:
+            return api_key_header
+    elif _API_KEY_BYTES is not None and hmac.compare_digest(api_key_header.encode(), _API_KEY_BYTES):
+        # | Constant-time comparison so the key can't be guessed from response timing
         return api_key_header
     raise HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -49,17 +98,34 @@ async def get_api_key(api_key_header: str = Security(api_key_header)):
 
 # - Models for API requests and responses
 class ReportRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     topic: str = Field(..., description="The topic for the report")
     config_overrides: Optional[Dict[str, Any]] = Field(None, description="Optional configuration overrides")
 
 class ReportResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     topic: str = Field(..., description="The topic of the report")
     content: str = Field(..., description="The generated report content")
 
-# - In-memory job store (replace with Redis or database in production)
-JOBS = {}
-ACTIVE_JOBS_QUEUE = deque(maxlen=10)  # Limit concurrent jobs
-MAX_JOB_AGE_SECONDS = 3600  # 1 hour
+# - Job store, in Redis when REDIS_URL is set so every server process shares it
+job_store = create_job_store()
+USE_JOB_QUEUE = isinstance(job_store, RedisJobStore)  # Jobs are processed by worker.py instead of this process
+MAX_CONCURRENT = 10  # Limit concurrent jobs
+ACTIVE_JOBS: set[str] = set()  # Jobs currently running
+JOB_SEMAPHORE = asyncio.Semaphore(MAX_CONCURRENT)  # Extra jobs wait for a free slot
+WAITING_JOBS = set()  # Jobs waiting for a free slot
+BACKGROUND_TASKS = set()  # Keep references to running job tasks
+MAX_GRAPH_CONCURRENCY = int(os.getenv("MAX_GRAPH_CONCURRENCY", "4"))  # Parallel section branches per job
+
+# - Job progress reported when a graph node finishes
+NODE_PROGRESS = {
+    "generate_report_plan": (0.2, "Generating search queries..."),
+    "generate_all_queries": (0.3, "Searching for relevant information..."),
+    "gather_completed_sections": (0.8, "Writing final sections..."),
+    "write_final_sections": (0.9, "Compiling final report..."),
+}
 
 class JobStatus:
     QUEUED = "queued"
@@ -68,194 +134,163 @@ class JobStatus:
     FAILED = "failed"
 
 class JobResult(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     job_id: str
     status: str
     progress: float = 0.0
     message: str = ""
     report: Optional[ReportResponse] = None
-    position_in_queue: Optional[int] = None
-    estimated_time: Optional[int] = None
     error: Optional[str] = None
 
 # - Check server readiness
-@app.get("/health")
+# | Routes with a response_model are serialized by Pydantic, orjson only helps plain dict responses
+@app.get("/health", response_class=ORJSONResponse)
 async def health_check():
     """Health check endpoint with server load information."""
-    current_load = len(ACTIVE_JOBS_QUEUE)
-    
-    # | server_status = "busy" if current_load >= ACTIVE_JOBS_QUEUE.maxlen else "ready"
-    if ACTIVE_JOBS_QUEUE.maxlen is not None and isinstance(current_load, int):
-        server_status = "busy" if current_load >= ACTIVE_JOBS_QUEUE.maxlen else "ready"
+    if USE_JOB_QUEUE:
+        # | Capacity is the sum of WORKER_CONCURRENCY over the workers with a live heartbeat
+        current_load, max_capacity = await job_store.worker_load()
+        queued_jobs = await job_store.queue_length()
     else:
-        server_status = "unknown"
+        current_load, max_capacity = len(ACTIVE_JOBS), MAX_CONCURRENT
+        queued_jobs = len(WAITING_JOBS)
+    
+    server_status = "busy" if current_load >= max_capacity else "ready"
 
     # | Check for cold start
-    is_cold_start = time.time() - app.state.startup_time < 30 if hasattr(app.state, "startup_time") else True
+    is_cold_start = time.time() < app.state.cold_start_deadline
     
     return {
         "status": "ok",
         "server_status": server_status,
         "current_load": current_load,
-        "max_capacity": ACTIVE_JOBS_QUEUE.maxlen,
+        "max_capacity": max_capacity,
+        "queued_jobs": queued_jobs,
         "is_warming_up": is_cold_start
     }
 
-@app.on_event("startup")
-async def startup_event():
-    app.state.startup_time = time.time()
-    # | Start background task to clean up old jobs
-    asyncio.create_task(cleanup_old_jobs())
-
-async def cleanup_old_jobs():
-    while True:
-        try:
-            current_time = time.time()
-            job_ids_to_remove = []
-            
-            for job_id, job_data in JOBS.items():
-                if current_time - job_data["created_at"] > MAX_JOB_AGE_SECONDS:
-                    job_ids_to_remove.append(job_id)
-            
-            for job_id in job_ids_to_remove:
-                del JOBS[job_id]
-                
-            await asyncio.sleep(300)  # Check every 5 minutes
-        except Exception as e:
-            print(f"Error cleaning up jobs: {str(e)}")
-            await asyncio.sleep(300)
-
 # - Modified endpoint to start report generation
 @app.post("/generate-report", response_model=JobResult)
 async def start_report_generation(request: ReportRequest, api_key: str = Depends(get_api_key)):
     """
     Start generating a report asynchronously and return a job ID immediately.
     """
-    job_id = str(uuid.uuid4())
+    job_id = uuid.uuid4().hex
     
-    # | Check server load
-    if ACTIVE_JOBS_QUEUE.maxlen is not None and len(ACTIVE_JOBS_QUEUE) >= ACTIVE_JOBS_QUEUE.maxlen:
-        position = len(ACTIVE_JOBS_QUEUE) + 1
-        JOBS[job_id] = {
-            "status": JobStatus.QUEUED,
-            "progress": 0.0,
-            "message": f"Queued (position {position})",
-            "created_at": time.time(),
-            "request": request.dict(),
-            "position_in_queue": position,
-            "estimated_time": position * 60  # Rough estimate: 1 minute per job
-        }
-        return JobResult(
-            job_id=job_id,
-            status=JobStatus.QUEUED,
-            message=f"Your request is queued (position {position})",
-            position_in_queue=position,
-            estimated_time=position * 60
-        )
+    # | Jobs over the concurrency limit, or handed to the workers, wait for a free slot
+    queued = USE_JOB_QUEUE or JOB_SEMAPHORE.locked()
     
     # | Create job record
-    JOBS[job_id] = {
-        "status": JobStatus.PROCESSING,
-        "progress": 0.0,
-        "message": "Starting research...",
-        "created_at": time.time(),
-        "request": request.dict()
-    }
+    job_status = JobStatus.QUEUED if queued else JobStatus.PROCESSING
+    await job_store.create(job_id, JobRecord(
+        status=job_status,
+        topic=request.topic,
+        created_at=time.time(),
+        message="Queued, waiting for a free slot..." if queued else "Starting research...",
+        config_overrides=request.config_overrides
+    ))
     
-    # | Start processing in background thread
-    threading.Thread(
-        target=process_report_job,
-        args=(job_id, request)
-    ).start()
+    if USE_JOB_QUEUE:
+        # | Queue the job for worker.py
+        await job_store.enqueue(job_id)
+    else:
+        # | Start processing in a background task on the server event loop
+        task = asyncio.create_task(process_report_job(job_id, request.topic, request.config_overrides))
+        BACKGROUND_TASKS.add(task)
+        task.add_done_callback(BACKGROUND_TASKS.discard)
     
     # | Return immediately with job ID
     return JobResult(
         job_id=job_id,
-        status=JobStatus.PROCESSING,
-        message="Research started. Please check job status to monitor progress."
+        status=job_status,
+        message="Your request is queued. Please check job status to monitor progress." if queued else "Research started. Please check job status to monitor progress."
     )
 
-def process_report_job(job_id: str, request: ReportRequest):
-    """Process report generation in background thread"""
+async def process_report_job(job_id: str, topic: str, config_overrides: Optional[Dict[str, Any]] = None):
+    """Process report generation in a background task, once a slot is free"""
+    # | Wait in FIFO order for a free slot
+    WAITING_JOBS.add(job_id)
+    async with JOB_SEMAPHORE:
+        WAITING_JOBS.discard(job_id)
+        ACTIVE_JOBS.add(job_id)
+        try:
+            await run_report_job(job_id, topic, config_overrides)
+        finally:
+            # | Remove from active jobs
+            ACTIVE_JOBS.discard(job_id)
+
+async def run_report_job(job_id: str, topic: str, config_overrides: Optional[Dict[str, Any]] = None):
+    """Run the report graph for a job and store its progress and result (worker.py limits concurrency itself)"""
     try:
-        ACTIVE_JOBS_QUEUE.append(job_id)
-        
         # | Update job status
-        JOBS[job_id]["status"] = JobStatus.PROCESSING
-        JOBS[job_id]["progress"] = 0.1
-        JOBS[job_id]["message"] = "Planning report structure..."
-        
-        # | Set up config like in the original function
-        thread_id = str(uuid.uuid4())
-        config_base = {
-            "configurable": {
-                "search_api": os.getenv("SEARCH_API"),
-                "planner_provider": os.getenv("PLANNER_PROVIDER"),
-                "planner_model": os.getenv("PLANNER_MODEL"),
-                "writer_provider": os.getenv("WRITER_PROVIDER"),
-                "writer_model": os.getenv("WRITER_MODEL"),
-                "thread_id": thread_id,
-            }
-        }
-        
-        # | Apply overrides
-        if request.config_overrides:
-            for key, value in request.config_overrides.items():
-                config_base["configurable"][key] = value
-        
-        # | For each major step, update progress
-        topic_input = ReportStateInput(topic=request.topic)
-        
-        # | Run the graph synchronously in this thread
-        # | Mock progress updates (in production, these would come from actual graph progress)
-        progress_steps = [
-            (0.2, "Generating search queries..."),
-            (0.3, "Searching for relevant information..."),
-            (0.5, "Analyzing search results..."),
-            (0.7, "Writing report sections..."),
-            (0.9, "Reviewing and refining content...")
-        ]
-        
-        for progress, message in progress_steps:
-            # | In a real implementation, these updates would be interspersed with actual processing
-            JOBS[job_id]["progress"] = progress
-            JOBS[job_id]["message"] = message
-            time.sleep(2)  # Simulate work happening
-        
-        # | Run the actual graph
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        from graph import RunnableConfig  # Ensure RunnableConfig is imported
-        config_casted = RunnableConfig(**config_base["configurable"])  # Cast to RunnableConfig
-        result = loop.run_until_complete(graph.ainvoke(topic_input, config=config_casted))
-        loop.close()
-        
+        await job_store.update(job_id, status=JobStatus.PROCESSING, progress=0.1, message="Planning report structure...")
+    
+        # | Set up config from the template, then apply overrides
+        configurable = {**CONFIG_TEMPLATE, "thread_id": uuid.uuid4().hex}
+        if config_overrides:
+            configurable.update(config_overrides)
+    
+        topic_input = ReportStateInput(topic=topic)
+    
+        # | Run the actual graph, updating progress as each node finishes
+        config_casted = RunnableConfig(configurable=configurable, max_concurrency=MAX_GRAPH_CONCURRENCY)  # Cast to RunnableConfig and bound parallel LLM calls
+        result = {}
+        research_done = 0
+        research_total = 0
+        async for update in graph.astream(topic_input, config=config_casted, stream_mode="updates"):
+            for node, node_update in update.items():
+                if node == "generate_report_plan" and node_update:
+                    research_total = len(node_update.get("research_sections", []))
+                elif node == "build_section_with_web_research":
+                    research_done += 1
+                    await job_store.update(job_id, 
+                                           progress=0.3 + 0.5 * research_done / max(research_total, 1),
+                                           message=f"Researched {research_done}/{research_total} sections...")
+                elif node == "compile_final_report":
+                    result = node_update
+                if node in NODE_PROGRESS:
+                    progress, message = NODE_PROGRESS[node]
+                    await job_store.update(job_id, progress=progress, message=message)
+    
         # | Check for the final report in the result
         if isinstance(result, dict) and "final_report" in result:
             # | Store the completed report
-            JOBS[job_id]["status"] = JobStatus.COMPLETED
-            JOBS[job_id]["progress"] = 1.0
-            JOBS[job_id]["message"] = "Report completed"
-            JOBS[job_id]["report"] = {
-                "topic": request.topic,
-                "content": result["final_report"]
-            }
+            await job_store.update(job_id, 
+                                   status=JobStatus.COMPLETED,
+                                   progress=1.0,
+                                   message="Report completed",
+                                   report={
+                                       "topic": topic,
+                                       "content": result["final_report"]
+                                   })
         else:
             # | If no final report was returned
-            JOBS[job_id]["status"] = JobStatus.FAILED
-            JOBS[job_id]["message"] = "Failed to generate report"
-            JOBS[job_id]["error"] = "Graph finished but did not return a final report"
-    
+            await job_store.update(job_id, 
+                                   status=JobStatus.FAILED,
+                                   message="Failed to generate report",
+                                   error="Graph finished but did not return a final report")
+
+    except asyncio.CancelledError:
+        # | The process is shutting down, queued jobs are retried once their worker's heartbeat expires
+        if USE_JOB_QUEUE:
+            await job_store.update(job_id, 
+                                   status=JobStatus.QUEUED,
+                                   message="Worker stopped, waiting to be retried...")
+        else:
+            await job_store.update(job_id, 
+                                   status=JobStatus.FAILED,
+                                   message="Server stopped before the report was completed",
+                                   error="Job cancelled")
+        raise
+
     except Exception as e:
         # | Handle exceptions
         print(f"Error generating report: {str(e)}")
-        JOBS[job_id]["status"] = JobStatus.FAILED
-        JOBS[job_id]["message"] = "Error occurred during report generation"
-        JOBS[job_id]["error"] = str(e)
-    
-    finally:
-        # | Remove from active jobs queue
-        if job_id in ACTIVE_JOBS_QUEUE:
-            ACTIVE_JOBS_QUEUE.remove(job_id)
+        await job_store.update(job_id, 
+                               status=JobStatus.FAILED,
+                               message="Error occurred during report generation",
+                               error=str(e))
 
 # - Add endpoint to check job status
 @app.get("/job-status/{job_id}", response_model=JobResult)
@@ -263,39 +298,57 @@ async def get_job_status(job_id: str, api_key: str = Depends(get_api_key)):
     """
     Check the status of a report generation job.
     """
-    if job_id not in JOBS:
+    job = await job_store.get(job_id)
+    if job is None:
         raise HTTPException(
             status_code=404,
             detail=f"Job with ID {job_id} not found"
         )
     
-    job_data = JOBS[job_id]
-    result = JobResult(
+    return job_result(job_id, job)
+
+def job_result(job_id: str, job: JobRecord) -> JobResult:
+    """Build the public status of a job from its record."""
+    return JobResult(
         job_id=job_id,
-        status=job_data["status"],
-        progress=job_data["progress"],
-        message=job_data["message"]
+        status=job.status,
+        progress=job.progress,
+        message=job.message,
+        report=ReportResponse(**job.report) if job.report else None,
+        error=job.error
     )
-    
-    # Add optional fields if they exist
-    if "position_in_queue" in job_data:
-        result.position_in_queue = job_data["position_in_queue"]
-    
-    if "estimated_time" in job_data:
-        result.estimated_time = job_data["estimated_time"]
-    
-    if "error" in job_data:
-        result.error = job_data["error"]
-    
-    if "report" in job_data and job_data["report"]:
-        result.report = ReportResponse(**job_data["report"])
-    
-    return result
+
+# - Push job status updates as Server-Sent Events instead of polling
+@app.get("/job-stream/{job_id}")
+async def stream_job_status(job_id: str, api_key: str = Depends(get_api_key)):
+    """
+    Stream the status of a report generation job until it completes or fails.
+    """
+    if await job_store.get(job_id) is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Job with ID {job_id} not found"
+        )
+
+    async def event_stream():
+        async with aclosing(job_store.watch(job_id)) as updates:
+            async for job in updates:
+                yield f"data: {job_result(job_id, job).model_dump_json()}\n\n"
+                if job.status in (JobStatus.COMPLETED, JobStatus.FAILED):
+                    break
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
 
 if __name__ == "__main__":
+    import sys
     import uvicorn
-    # - Run the server with Uvicorn
-    uvicorn.run("server:app", host="localhost", port=8000, reload=True)
+    # - Run the server with Uvicorn on uvloop (not available on Windows) and the httptools parser
+    uvicorn.run("server:app", host="localhost", port=8000, 
+                loop="asyncio" if sys.platform == "win32" else "uvloop", 
+                http="httptools", 
+                reload=True)
 
 # - To run the server, use the command:
-# $ uvicorn server:app --reload
+# $ uvicorn server:app --loop uvloop --http httptools --reload
+# - In production, with REDIS_URL set, run one Uvicorn worker per CPU:
+# $ gunicorn server:app -c gunicorn.conf.py
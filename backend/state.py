@@ -1,7 +1,12 @@
 from typing import Annotated, List, TypedDict, Literal # Optional
-import operator  # Add this import
 from pydantic import BaseModel, Field #, constr
 
+from configuration import Configuration
+
+def _append(a: list, b: list) -> list:
+    """Reducer for completed_sections, returns a new list since checkpoints keep a reference to the old one."""
+    return [*(a or ()), *b]
+
 class Section(BaseModel):
     name: str = Field(
         description="Name for this section of the report.",
@@ -48,9 +53,12 @@ class ReportState(TypedDict):
     topic: str # Report topic    
     feedback_on_report_plan: str # Feedback on the report plan
     sections: list[Section] # List of report sections 
-    completed_sections: Annotated[list[Section], operator.add] # Use Annotated type with add reducer
+    research_sections: list[Section] # Sections that need web research
+    non_research_sections: list[Section] # Sections written from the completed research
+    completed_sections: Annotated[list[Section], _append] # Use Annotated type with append reducer
     report_sections_from_research: str # String of any completed sections from research to write final sections
     final_report: str # Final report
+    resolved_config: Configuration # Configuration resolved once in generate_report_plan
 
 class SectionState(TypedDict):
     topic: str # Report topic
@@ -58,8 +66,8 @@ class SectionState(TypedDict):
     search_iterations: int # Number of search iterations done
     search_queries: list[SearchQuery] # List of search queries
     source_str: str # String of formatted source content from web search
-    report_sections_from_research: str # String of any completed sections from research to write final sections
-    completed_sections: Annotated[list[Section], operator.add] # Use Annotated type with add reducer
+    resolved_config: Configuration # Configuration resolved once in generate_report_plan
+    completed_sections: Annotated[list[Section], _append] # Use Annotated type with append reducer
 
 class SectionOutputState(TypedDict):
-    completed_sections: Annotated[list[Section], operator.add] # Use Annotated type here too
+    completed_sections: Annotated[list[Section], _append] # Use Annotated type here too
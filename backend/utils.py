@@ -25,8 +25,10 @@ from langsmith import traceable
 from state import Section
 from langchain.chat_models import init_chat_model
 from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable
 import concurrent.futures
 from aiohttp import ClientTimeout
+from cachetools import LRUCache
 
 
 
@@ -150,9 +152,7 @@ def deduplicate_and_format_sources(search_response, max_tokens_per_source, inclu
 
 def format_sections(sections: list[Section]) -> str:
     """ Format a list of sections into a string """
-    formatted_str = ""
-    for idx, section in enumerate(sections, 1):
-        formatted_str += f"""
+    return "".join(f"""
 {'='*60}
 Section {idx}: {section.name}
 {'='*60}
@@ -164,8 +164,7 @@ Requires Research:
 Content:
 {section.content if section.content else '[Not yet written]'}
 
-"""
-    return formatted_str
+""" for idx, section in enumerate(sections, 1))
 
 @traceable
 async def tavily_search_async(search_queries):
@@ -1245,27 +1244,44 @@ async def select_and_execute_search(search_api: str, query_list: list[str], para
     else:
         raise ValueError(f"Unsupported search API: {search_api}")
 
-def init_model_with_provider(model_name: str, provider: str, **kwargs) -> BaseChatModel:
-    """Initialize a chat model with proper provider-specific settings."""
-    try:
-        if provider == "groq":
-            # Import the Groq provider directly
-            from langchain_groq import ChatGroq
-            
-            # Check for API key
-            import os
-            api_key = os.environ.get("GROQ_API_KEY")
-            if not api_key:
-                raise ValueError("GROQ_API_KEY environment variable not set")
-                
-            # Initialize Groq model directly
-            return ChatGroq(
-                model=model_name,
-                temperature=0.1
-            )
-        else:
-            # Use standard init_chat_model for other providers
-            return init_chat_model(model=model_name, model_provider=provider, **kwargs)
-    except Exception as e:
-        print(f"Error initializing model {model_name} with provider {provider}: {e}")
-        raise
+# | Models keyed by (event loop, model_name, provider, [schema,] thinking_budget)
+_chat_models: LRUCache = LRUCache(maxsize=32)
+_structured_models: LRUCache = LRUCache(maxsize=32)
+
+def _init_chat_model(model_name: str, provider: str, thinking_budget: Optional[int] = None) -> BaseChatModel:
+    """Initialize a chat model, see get_chat_model."""
+    if thinking_budget:
+        return init_chat_model(model=model_name, 
+                               model_provider=provider, 
+                               max_tokens=20_000, 
+                               thinking={"type": "enabled", "budget_tokens": thinking_budget})
+    return init_chat_model(model=model_name, model_provider=provider)
+
+async def get_chat_model(model_name: str, provider: str, thinking_budget: Optional[int] = None) -> BaseChatModel:
+    """Get a chat model reused across graph nodes and runs on the current event loop.
+    
+    Models keep async HTTP clients bound to the loop they were first used on, so the
+    cache is keyed by loop. A missing model is built off the event loop.
+    
+    Args:
+        model_name: Name of the model to use
+        provider: Provider of the model
+        thinking_budget: Optional extended thinking budget in tokens
+        
+    Returns:
+        The cached chat model
+    """
+    key = (asyncio.get_running_loop(), model_name, provider, thinking_budget)
+    model = _chat_models.get(key)
+    if model is None:
+        model = _chat_models[key] = await asyncio.to_thread(_init_chat_model, model_name, provider, thinking_budget)
+    return model
+
+async def get_structured_model(model_name: str, provider: str, schema: type, thinking_budget: Optional[int] = None) -> Runnable:
+    """Get a cached chat model bound to a structured output schema, see get_chat_model."""
+    key = (asyncio.get_running_loop(), model_name, provider, schema, thinking_budget)
+    model = _structured_models.get(key)
+    if model is None:
+        chat_model = await get_chat_model(model_name, provider, thinking_budget)
+        model = _structured_models[key] = await asyncio.to_thread(chat_model.with_structured_output, schema)
+    return model
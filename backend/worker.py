@@ -0,0 +1,46 @@
+"""Report generation worker consuming the Redis job queue.
+
+Run one or more workers next to the API when REDIS_URL is set:
+
+    $ python worker.py
+"""
+import asyncio
+import os
+import uuid
+
+from job_store import WORKER_TTL_SECONDS, RedisJobStore
+from server import job_store, run_report_job
+
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "10"))  # Jobs processed at once by this worker
+WORKER_ID = uuid.uuid4().hex  # Identifies this worker's heartbeat and processing list in Redis
+
+async def send_heartbeats():
+    """Keep this worker registered and requeue the jobs of workers that died."""
+    while True:
+        await job_store.heartbeat(WORKER_ID, WORKER_CONCURRENCY)
+        requeued = await job_store.requeue_orphaned_jobs()
+        if requeued:
+            print(f"Requeued {requeued} jobs of stopped workers")
+        await asyncio.sleep(WORKER_TTL_SECONDS / 3)
+
+async def consume_jobs():
+    """Pop queued jobs one at a time and run them."""
+    while True:
+        job_id = await job_store.dequeue(WORKER_ID)
+        job = await job_store.get(job_id)
+        await job_store.job_started(WORKER_ID)
+        if job is not None:
+            # | Errors are stored on the job by run_report_job. If this worker is cancelled, the job stays
+            # | in its processing list and is requeued by another worker once the heartbeat expires
+            await run_report_job(job_id, job.topic, job.config_overrides)
+        await job_store.job_finished(WORKER_ID, job_id)
+
+async def main():
+    if not isinstance(job_store, RedisJobStore):
+        raise RuntimeError("REDIS_URL must be set to run a queue worker")
+    # | Register before taking jobs so this worker's processing list isn't mistaken for an orphan
+    await job_store.register_worker(WORKER_ID, WORKER_CONCURRENCY)
+    await asyncio.gather(send_heartbeats(), *(consume_jobs() for _ in range(WORKER_CONCURRENCY)))
+
+if __name__ == "__main__":
+    asyncio.run(main())